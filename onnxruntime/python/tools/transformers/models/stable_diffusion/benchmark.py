@@ -172,14 +172,44 @@ def measure_gpu_memory(monitor_type, func, start_memory=None):
     return None
 
 
-def get_ort_pipeline(model_name: str, directory: str, provider, disable_safety_checker: bool):
+def register_shared_cuda_allocator(device_id: int = 0):
+    import onnxruntime
+
+    # create_and_register_allocator_v2 is available since v1.16.
+    if not hasattr(onnxruntime, "create_and_register_allocator_v2"):
+        raise RuntimeError(
+            f"--share_cuda_allocator requires onnxruntime-gpu 1.16.0 or newer, got {onnxruntime.__version__}"
+        )
+
+    cuda_mem_info = onnxruntime.OrtMemoryInfo(
+        "Cuda",
+        onnxruntime.OrtAllocatorType.ORT_ARENA_ALLOCATOR,
+        device_id,
+        onnxruntime.OrtMemType.DEFAULT,
+    )
+    # Use default arena settings: no limit and default extend strategy.
+    arena_cfg = onnxruntime.OrtArenaCfg(0, -1, -1, -1)
+    onnxruntime.create_and_register_allocator_v2(
+        "CUDAExecutionProvider", cuda_mem_info, {"device_id": str(device_id)}, arena_cfg
+    )
+
+
+def get_ort_pipeline(
+    model_name: str, directory: str, provider, disable_safety_checker: bool, use_env_allocators: bool = False
+):
     from diffusers import DPMSolverMultistepScheduler, OnnxStableDiffusionPipeline
 
     import onnxruntime
 
+    # The same session options are used by all models (text encoder, unet, vae decoder etc.) in the pipeline.
+    session_options = onnxruntime.SessionOptions()
+    if use_env_allocators:
+        # Sessions run one after another, so they can share one memory arena registered in the environment
+        # instead of each session growing its own arena.
+        session_options.add_session_config_entry("session.use_env_allocators", "1")
+
     if directory is not None:
         assert os.path.exists(directory)
-        session_options = onnxruntime.SessionOptions()
         pipe = OnnxStableDiffusionPipeline.from_pretrained(
             directory,
             provider=provider,
@@ -190,6 +220,7 @@ def get_ort_pipeline(model_name: str, directory: str, provider, disable_safety_c
             model_name,
             revision="onnx",
             provider=provider,
+            sess_options=session_options,
             use_auth_token=True,
         )
     pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
@@ -202,24 +233,37 @@ def get_ort_pipeline(model_name: str, directory: str, provider, disable_safety_c
     return pipe
 
 
-def get_torch_pipeline(model_name: str, disable_safety_checker: bool, enable_torch_compile: bool, use_xformers: bool):
+def get_torch_pipeline(
+    model_name: str,
+    disable_safety_checker: bool,
+    enable_torch_compile: bool,
+    use_xformers: bool,
+    torch_compile_mode: str = "default",
+    enable_vae_tiling: bool = False,
+):
     from diffusers import DPMSolverMultistepScheduler, StableDiffusionPipeline
     from torch import channels_last, float16
 
     pipe = StableDiffusionPipeline.from_pretrained(model_name, torch_dtype=float16).to("cuda")
 
     pipe.unet.to(memory_format=channels_last)  # in-place operation
+    pipe.vae.to(memory_format=channels_last)  # in-place operation
 
     if use_xformers:
         pipe.enable_xformers_memory_efficient_attention()
 
+    if enable_vae_tiling:
+        # Decode latents in overlapped tiles to reduce peak memory of VAE decoder for large images.
+        pipe.enable_vae_tiling()
+
     if enable_torch_compile:
         import torch
 
-        pipe.unet = torch.compile(pipe.unet)
-        pipe.vae = torch.compile(pipe.vae)
-        pipe.text_encoder = torch.compile(pipe.text_encoder)
-        print("Torch compiled unet, vae and text_encoder")
+        # Modes "reduce-overhead" and "max-autotune" capture CUDA graphs to reduce kernel launch overhead.
+        pipe.unet = torch.compile(pipe.unet, mode=torch_compile_mode)
+        pipe.vae = torch.compile(pipe.vae, mode=torch_compile_mode)
+        pipe.text_encoder = torch.compile(pipe.text_encoder, mode=torch_compile_mode)
+        print(f"Torch compiled unet, vae and text_encoder with mode={torch_compile_mode}")
 
     pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
     pipe.set_progress_bar_config(disable=True)
@@ -247,6 +291,7 @@ def run_ort_pipeline(
     batch_count,
     start_memory,
     memory_monitor_type,
+    guidance_scale: float = 7.5,
 ):
     from diffusers import OnnxStableDiffusionPipeline
 
@@ -255,7 +300,14 @@ def run_ort_pipeline(
     prompts = example_prompts()
 
     def warmup():
-        pipe("warm up", height, width, num_inference_steps=steps, num_images_per_prompt=batch_size)
+        pipe(
+            "warm up",
+            height,
+            width,
+            num_inference_steps=steps,
+            guidance_scale=guidance_scale,
+            num_images_per_prompt=batch_size,
+        )
 
     # Run warm up, and measure GPU memory of two runs
     # cuDNN/MIOpen The first run has  algo search so it might need more memory)
@@ -277,7 +329,7 @@ def run_ort_pipeline(
                 width,
                 num_inference_steps=steps,
                 negative_prompt=None,
-                guidance_scale=7.5,
+                guidance_scale=guidance_scale,
                 num_images_per_prompt=batch_size,
             ).images
             inference_end = time.time()
@@ -295,6 +347,7 @@ def run_ort_pipeline(
         "height": height,
         "width": width,
         "steps": steps,
+        "guidance_scale": guidance_scale,
         "batch_size": batch_size,
         "batch_count": batch_count,
         "num_prompts": num_prompts,
@@ -316,6 +369,7 @@ def run_torch_pipeline(
     batch_count,
     start_memory,
     memory_monitor_type,
+    guidance_scale: float = 7.5,
 ):
     import torch
 
@@ -323,7 +377,14 @@ def run_torch_pipeline(
 
     # total 2 runs of warm up, and measure GPU memory for CUDA EP
     def warmup():
-        pipe("warm up", height, width, num_inference_steps=steps, num_images_per_prompt=batch_size)
+        pipe(
+            "warm up",
+            height,
+            width,
+            num_inference_steps=steps,
+            guidance_scale=guidance_scale,
+            num_images_per_prompt=batch_size,
+        )
 
     # Run warm up, and measure GPU memory of two runs (The first run has cuDNN algo search so it might need more memory)
     first_run_memory = measure_gpu_memory(memory_monitor_type, warmup, start_memory)
@@ -346,7 +407,7 @@ def run_torch_pipeline(
                 height=height,
                 width=width,
                 num_inference_steps=steps,
-                guidance_scale=7.5,
+                guidance_scale=guidance_scale,
                 negative_prompt=None,
                 num_images_per_prompt=batch_size,
                 generator=None,  # torch.Generator
@@ -366,6 +427,7 @@ def run_torch_pipeline(
         "height": height,
         "width": width,
         "steps": steps,
+        "guidance_scale": guidance_scale,
         "batch_size": batch_size,
         "batch_count": batch_count,
         "num_prompts": num_prompts,
@@ -390,13 +452,19 @@ def run_ort(
     start_memory,
     memory_monitor_type,
     tuning,
+    share_cuda_allocator: bool = False,
+    guidance_scale: float = 7.5,
 ):
     provider_and_options = provider
     if tuning and provider in ["CUDAExecutionProvider", "ROCMExecutionProvider"]:
         provider_and_options = (provider, {"tunable_op_enable": 1, "tunable_op_tuning_enable": 1})
 
+    use_env_allocators = share_cuda_allocator and provider == "CUDAExecutionProvider"
+    if use_env_allocators:
+        register_shared_cuda_allocator()
+
     load_start = time.time()
-    pipe = get_ort_pipeline(model_name, directory, provider_and_options, disable_safety_checker)
+    pipe = get_ort_pipeline(model_name, directory, provider_and_options, disable_safety_checker, use_env_allocators)
     load_end = time.time()
     print(f"Model loading took {load_end - load_start} seconds")
 
@@ -412,6 +480,7 @@ def run_ort(
         batch_count,
         start_memory,
         memory_monitor_type,
+        guidance_scale,
     )
 
     result.update(
@@ -420,6 +489,8 @@ def run_ort(
             "directory": directory,
             "provider": provider,
             "disable_safety_checker": disable_safety_checker,
+            "share_cuda_allocator": use_env_allocators,
+            "enable_vae_tiling": False,
         }
     )
     return result
@@ -438,6 +509,9 @@ def run_torch(
     batch_count,
     start_memory,
     memory_monitor_type,
+    torch_compile_mode: str = "default",
+    enable_vae_tiling: bool = False,
+    guidance_scale: float = 7.5,
 ):
     import torch
 
@@ -447,7 +521,9 @@ def run_torch(
     torch.set_grad_enabled(False)
 
     load_start = time.time()
-    pipe = get_torch_pipeline(model_name, disable_safety_checker, enable_torch_compile, use_xformers)
+    pipe = get_torch_pipeline(
+        model_name, disable_safety_checker, enable_torch_compile, use_xformers, torch_compile_mode, enable_vae_tiling
+    )
     load_end = time.time()
     print(f"Model loading took {load_end - load_start} seconds")
 
@@ -466,6 +542,7 @@ def run_torch(
                 batch_count,
                 start_memory,
                 memory_monitor_type,
+                guidance_scale,
             )
     else:
         result = run_torch_pipeline(
@@ -479,14 +556,18 @@ def run_torch(
             batch_count,
             start_memory,
             memory_monitor_type,
+            guidance_scale,
         )
 
+    compile_provider = "compile" if torch_compile_mode == "default" else f"compile_{torch_compile_mode}"
     result.update(
         {
             "model_name": model_name,
             "directory": None,
-            "provider": "compile" if enable_torch_compile else "xformers" if use_xformers else "default",
+            "provider": compile_provider if enable_torch_compile else "xformers" if use_xformers else "default",
             "disable_safety_checker": disable_safety_checker,
+            "share_cuda_allocator": False,
+            "enable_vae_tiling": enable_vae_tiling,
         }
     )
     return result
@@ -523,6 +604,14 @@ def parse_arguments():
         "This will incur longer warmup latency, and is mandatory for some operators of ROCm EP.",
     )
 
+    parser.add_argument(
+        "--share_cuda_allocator",
+        required=False,
+        action="store_true",
+        help="Let all models in the onnxruntime pipeline share one CUDA memory arena. Only works for CUDA provider.",
+    )
+    parser.set_defaults(share_cuda_allocator=False)
+
     parser.add_argument(
         "-v",
         "--version",
@@ -558,6 +647,16 @@ def parse_arguments():
     )
     parser.set_defaults(enable_torch_compile=False)
 
+    parser.add_argument(
+        "--torch_compile_mode",
+        required=False,
+        type=str,
+        default="default",
+        choices=["default", "reduce-overhead", "max-autotune"],
+        help="Mode of torch.compile. Modes reduce-overhead and max-autotune use CUDA graphs. "
+        "Only works with --enable_torch_compile.",
+    )
+
     parser.add_argument(
         "--use_xformers",
         required=False,
@@ -566,6 +665,14 @@ def parse_arguments():
     )
     parser.set_defaults(use_xformers=False)
 
+    parser.add_argument(
+        "--enable_vae_tiling",
+        required=False,
+        action="store_true",
+        help="Decode latents in tiles to reduce GPU memory for large images. Only works for PyTorch.",
+    )
+    parser.set_defaults(enable_vae_tiling=False)
+
     parser.add_argument(
         "-b",
         "--batch_size",
@@ -600,6 +707,16 @@ def parse_arguments():
         help="Number of steps. Default is 50.",
     )
 
+    parser.add_argument(
+        "-g",
+        "--guidance_scale",
+        required=False,
+        type=float,
+        default=7.5,
+        help="Guidance scale of classifier free guidance. "
+        "Guidance is disabled when it is not greater than 1, and unet runs with half of the batch. Default is 7.5.",
+    )
+
     parser.add_argument(
         "-n",
         "--num_prompts",
@@ -640,6 +757,9 @@ def main():
     provider = PROVIDERS[args.provider]
     if args.engine == "onnxruntime":
         assert args.pipeline, "--pipeline should be specified for onnxruntime engine"
+        assert not args.enable_vae_tiling, "--enable_vae_tiling only works for torch engine"
+        assert args.torch_compile_mode == "default", "--torch_compile_mode only works for torch engine"
+        assert not args.share_cuda_allocator or args.provider == "cuda", "--share_cuda_allocator only works for cuda"
 
         if args.version in ["2.1"]:
             # Set a flag to avoid overflow in attention, which causes black image output in SD 2.1 model
@@ -660,8 +780,15 @@ def main():
             start_memory,
             memory_monitor_type,
             args.tuning,
+            args.share_cuda_allocator,
+            args.guidance_scale,
         )
     else:
+        assert not args.share_cuda_allocator, "--share_cuda_allocator only works for onnxruntime engine"
+        assert (
+            args.enable_torch_compile or args.torch_compile_mode == "default"
+        ), "--torch_compile_mode only works with --enable_torch_compile"
+
         result = run_torch(
             sd_model,
             args.batch_size,
@@ -675,6 +802,9 @@ def main():
             args.batch_count,
             start_memory,
             memory_monitor_type,
+            args.torch_compile_mode,
+            args.enable_vae_tiling,
+            args.guidance_scale,
         )
 
     print(result)
@@ -687,9 +817,12 @@ def main():
             "version",
             "provider",
             "disable_safety_checker",
+            "share_cuda_allocator",
+            "enable_vae_tiling",
             "height",
             "width",
             "steps",
+            "guidance_scale",
             "batch_size",
             "batch_count",
             "num_prompts",
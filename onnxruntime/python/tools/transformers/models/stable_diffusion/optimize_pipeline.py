@@ -20,6 +20,8 @@
 #    python optimize_pipeline.py -i ./sd-v2-1 -o ./sd-v2-1-fp16 --float16 --force_fp32_ops unet:MultiHeadAttention
 
 import argparse
+import hashlib
+import json
 import logging
 import os
 import shutil
@@ -43,6 +45,50 @@ from optimizer import optimize_by_onnxruntime, optimize_model  # noqa: E402
 
 logger = logging.getLogger(__name__)
 
+# Name of the file saved next to an optimized model to record how it was produced.
+OPTIMIZE_INFO_FILE_NAME = "optimize_info.json"
+
+
+def get_optimization_signature(source_model_dir: Path, settings: dict) -> str:
+    """Compute SHA-256 signature of source model files and optimization settings.
+
+    Args:
+        source_model_dir (Path): directory of source onnx model, including external data files if any.
+        settings (dict): optimization settings that could change the optimized model.
+
+    Returns:
+        str: hex digest of the signature
+    """
+    sha256 = hashlib.sha256()
+    for file_path in sorted(path for path in source_model_dir.rglob("*") if path.is_file()):
+        sha256.update(file_path.relative_to(source_model_dir).as_posix().encode())
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+    sha256.update(json.dumps(settings, sort_keys=True).encode())
+    return sha256.hexdigest()
+
+
+def is_optimized_model_up_to_date(
+    optimized_model_path: Path, signature: str, use_external_data_format: bool = False
+) -> bool:
+    """Check whether an optimized model exists and was produced from same source model and settings."""
+    info_path = optimized_model_path.parent / OPTIMIZE_INFO_FILE_NAME
+    if not (optimized_model_path.exists() and info_path.exists()):
+        return False
+
+    # External data is saved to a file named like model.onnx.data.
+    if use_external_data_format and not Path(str(optimized_model_path) + ".data").exists():
+        return False
+
+    try:
+        with open(info_path) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    return isinstance(info, dict) and info.get("signature") == signature
+
 
 def optimize_sd_pipeline(
     source_dir: Path,
@@ -53,17 +99,22 @@ def optimize_sd_pipeline(
     force_fp32_ops: List[str],
     enable_runtime_optimization: bool,
     args,
+    force: bool = False,
 ):
     """Optimize onnx models used in stable diffusion onnx pipeline and optionally convert to float16.
 
+    A model is skipped when its optimized model exists and was produced from same source model and settings,
+    unless force is True.
+
     Args:
         source_dir (Path): Root of input directory of stable diffusion onnx pipeline with float32 models.
         target_dir (Path): Root of output directory of stable diffusion onnx pipeline with optimized models.
-        overwrite (bool): Overwrite files if exists.
+        overwrite (bool): Overwrite files if exists. Models that are up to date are still skipped unless force is True.
         use_external_data_format (bool): save onnx model to two files: one for onnx graph, another for weights
         float16 (bool): use half precision
         force_fp32_ops(List[str]): operators that are forced to run in float32.
         enable_runtime_optimization(bool): run graph optimization using Onnx Runtime.
+        force (bool): optimize models even if they are up to date.
 
     Raises:
         RuntimeError: input onnx model does not exist
@@ -110,9 +161,34 @@ def optimize_sd_pipeline(
                 raise RuntimeError(message)
             continue
 
+        args.model_type = model_type
+        fusion_options = FusionOptions.parse(args)
+
+        if model_type in ["unet"]:
+            # Some optimizations are not available in v1.14 or older version: packed QKV and BiasAdd
+            has_all_optimizations = version.parse(onnxruntime.__version__) >= version.parse("1.15.0")
+            fusion_options.enable_packed_kv = float16 and fusion_options.enable_packed_kv
+            fusion_options.enable_packed_qkv = float16 and has_all_optimizations and fusion_options.enable_packed_qkv
+            fusion_options.enable_bias_add = has_all_optimizations and fusion_options.enable_bias_add
+
+        optimization_settings = {
+            "onnxruntime_version": onnxruntime.__version__,
+            "model_type": model_type,
+            "float16": float16,
+            "force_fp32_ops": force_fp32_operators[name],
+            "enable_runtime_optimization": enable_runtime_optimization,
+            "use_external_data_format": use_external_data_format,
+            "fusion_options": vars(fusion_options),
+        }
+        signature = get_optimization_signature(onnx_model_path.parent, optimization_settings)
+
         # Prepare output directory
         optimized_model_path = target_dir / name / "model.onnx"
         output_dir = optimized_model_path.parent
+        if not force and is_optimized_model_up_to_date(optimized_model_path, signature, use_external_data_format):
+            logger.info("%s is up to date with source model and settings. Skip optimization.", optimized_model_path)
+            continue
+
         if optimized_model_path.exists():
             if not overwrite:
                 raise RuntimeError(f"output onnx model path existed: {optimized_model_path}")
@@ -125,16 +201,6 @@ def optimize_sd_pipeline(
         # Right now, onnxruntime does not save >2GB model so we use script to optimize unet instead.
         logger.info(f"Optimize {onnx_model_path}...")
 
-        args.model_type = model_type
-        fusion_options = FusionOptions.parse(args)
-
-        if model_type in ["unet"]:
-            # Some optimizations are not available in v1.14 or older version: packed QKV and BiasAdd
-            has_all_optimizations = version.parse(onnxruntime.__version__) >= version.parse("1.15.0")
-            fusion_options.enable_packed_kv = float16 and fusion_options.enable_packed_kv
-            fusion_options.enable_packed_qkv = float16 and has_all_optimizations and fusion_options.enable_packed_qkv
-            fusion_options.enable_bias_add = has_all_optimizations and fusion_options.enable_bias_add
-
         m = optimize_model(
             str(onnx_model_path),
             model_type=model_type,
@@ -169,9 +235,22 @@ def optimize_sd_pipeline(
                 model = onnx.load(str(ort_optimized_model_path), load_external_data=True)
                 m = model_type_class_mapping[model_type](model)
 
-        m.get_operator_statistics()
-        m.get_fused_operator_statistics()
+        operator_statistics = m.get_operator_statistics()
+        fused_operator_statistics = m.get_fused_operator_statistics()
         m.save_model_to_file(str(optimized_model_path), use_external_data_format=use_external_data_format)
+
+        # Save the signature after the model so that an interrupted run will not be treated as up to date.
+        with open(output_dir / OPTIMIZE_INFO_FILE_NAME, "w") as f:
+            json.dump(
+                {
+                    "signature": signature,
+                    "settings": optimization_settings,
+                    "operators": operator_statistics,
+                    "fused_operators": fused_operator_statistics,
+                },
+                f,
+                indent=2,
+            )
         logger.info("%s is optimized", name)
         logger.info("*" * 20)
 
@@ -275,10 +354,20 @@ def parse_arguments():
         "--overwrite",
         required=False,
         action="store_true",
-        help="Overwrite exists files.",
+        help="Overwrite exists files. Optimized models that are up to date with source models and settings are skipped "
+        "unless --force is used.",
     )
     parser.set_defaults(overwrite=False)
 
+    parser.add_argument(
+        "--force",
+        required=False,
+        action="store_true",
+        help="Optimize models even if they are up to date. Use it with --overwrite when the output directory exists. "
+        "The check does not cover changes of fusion scripts, so use this option after modifying them.",
+    )
+    parser.set_defaults(force=False)
+
     parser.add_argument(
         "-e",
         "--use_external_data_format",
@@ -309,6 +398,7 @@ def main():
         args.force_fp32_ops,
         args.inspect,
         args,
+        args.force,
     )
 
 